@@ -1,7 +1,14 @@
 #!/bin/env python3
 import sys
-import matplotlib.pyplot as plt
+import itertools
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import font_manager
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, MaxNLocator
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import numpy as np
 import math
 
@@ -19,19 +26,46 @@ colors = [
 
 marker = ['.', ',', 'o', 'v', '^', '<', '>', '1', '2', '3', '4', '8', 's', 'P', 'h', '+', 'x']
 
+block_size = 8 << 20
+
+def read_movements(path) -> pd.DataFrame:
+    # disk names as categoricals
+    disk = pa.dictionary(pa.int32(), pa.string())
+    column_types = {"now": pa.float64(), "from": disk, "to": disk, "size": pa.int64()}
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=block_size),
+        convert_options=pacsv.ConvertOptions(
+            column_types=column_types,
+            include_columns=list(column_types),
+        ),
+    )
+    keys = ["now", "from", "to"]
+    parts = [
+        batch.to_pandas().groupby(keys, observed=True, sort=False, as_index=False)["size"].sum()
+        for batch in reader
+    ]
+    if not parts:
+        return pd.DataFrame(columns=list(column_types))
+    # a timestamp may straddle two blocks
+    movements = pd.concat(parts, ignore_index=True).astype({"from": "category", "to": "category"})
+    return movements.groupby(keys, observed=True, sort=False, as_index=False)["size"].sum()
+
+def hms(x, _pos) -> str:
+    secs = int(x)
+    return f"{secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
 def plot_disk_movement(df: pd.DataFrame, path):
-    fig, ax = plt.subplots(1,1)
+    fig = Figure()
+    ax = fig.subplots(1,1)
 
-    disk_from_to = df[["from", "to"]].drop_duplicates()
-    for m, row in zip(marker, disk_from_to.iterrows()):
-        fro = row[1]["from"]
-        to  = row[1]["to"]
-        relevant = df.where(df["from"] == fro).where(df["to"] == to).dropna()
-        ax.plot(relevant["now"], relevant["size"], label=f"{fro} to {to}", marker=m)
+    markers = itertools.cycle(marker)
+    for (fro, to), relevant in df.groupby(["from", "to"], observed=True, sort=False):
+        ax.plot(relevant["now"], relevant["size"], label=f"{fro} to {to}", marker=next(markers))
 
     end_timestamp = df["now"].max()
-    ticks = ax.get_xticks()
-    ax.set_xticks(ticks, [f"{int(lbl/60/60)}:{int(lbl/60%60)}:{int(lbl%60)}" for lbl in ticks])
+    ax.xaxis.set_major_locator(MaxNLocator(nbins=6))
+    ax.xaxis.set_major_formatter(FuncFormatter(hms))
     ax.set_xlabel("Time (h:m:s)")
     ax.set_ylabel("Number of blocks moved")
     ax.set_xlim(0, end_timestamp)
@@ -42,6 +76,8 @@ if len(sys.argv) < 2:
     print(f"Usage: {sys.argv[0]} <PATH_TO_POLICY_CSV>")
     sys.exit(1)
 
-plt.rcParams["font.family"] = "Iosevka"
-policy_data = pd.read_csv(sys.argv[1])
+if any(font.name == "Iosevka" for font in font_manager.fontManager.ttflist):
+    matplotlib.rcParams["font.family"] = "Iosevka"
+matplotlib.rcParams["svg.fonttype"] = "none"
+policy_data = read_movements(sys.argv[1])
 plot_disk_movement(policy_data, "policy_movement")
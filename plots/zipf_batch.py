@@ -1,7 +1,15 @@
 #!/bin/env python3
 import sys
-import matplotlib.pyplot as plt
+# only svgs are written, no GUI backend needed
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import font_manager
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, MaxNLocator
+from matplotlib.collections import PolyCollection
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import numpy as np
 import math
 
@@ -18,63 +26,128 @@ colors = [
     "#000000",
 ]
 
-def plot_access_percentile(df: pd.DataFrame, pdf: pd.DataFrame, access, path):
-    fig, ax = plt.subplots(1,1)
+# latencies in us and the f32 interval fit float32
+app_columns = ["now", "interval", "read_total"] + [
+    f"{access}_{stat}"
+    for access in ["read", "write"]
+    for stat in ["avg", "max", "median", "p90", "p95", "p99"]
+]
+app_types = {column: pa.float32() for column in app_columns} | {
+    "now": pa.float64(),
+    "read_total": pa.int64(),
+}
+
+block_size = 8 << 20
+
+def read_csv(path, column_types) -> pd.DataFrame:
+    # multi-threaded arrow parser, only converting the requested columns
+    table = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types=column_types,
+            include_columns=list(column_types),
+        ),
+    )
+    return table.to_pandas(self_destruct=True)
+
+def read_unique(path, column) -> np.ndarray:
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=block_size),
+        convert_options=pacsv.ConvertOptions(
+            column_types={column: pa.float64()},
+            include_columns=[column],
+        ),
+    )
+    uniq = [unique(batch.column(0).to_numpy()) for batch in reader]
+    if not uniq:
+        return np.empty(0)
+    return unique(np.concatenate(uniq))
+
+def unique(arr: np.ndarray) -> np.ndarray:
+    # policy events are written in chronological order
+    if len(arr) == 0:
+        return arr
+    if np.all(arr[1:] >= arr[:-1]):
+        return arr[np.concatenate(([True], arr[1:] != arr[:-1]))]
+    return np.unique(arr)
+
+def hms(x, _pos) -> str:
+    secs = int(x)
+    return f"{secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
+def make_axes(policy_timestamps: np.ndarray, end_timestamp):
+    # scaffolding shared by the read and write plots
+    fig = Figure()
+    ax = fig.subplots(1,1)
+    ax.set_title("Zipf Batch - Latencies over Iteration")
+
+    # x in data, y in axes coordinates
+    marker_transform = ax.get_xaxis_transform()
+    ax.vlines(policy_timestamps, 0, 1, transform=marker_transform, color="black", linewidth=0.7, linestyle=":", alpha=0.8)
+    for timestamp in policy_timestamps:
+        ax.text(timestamp, 1, "M", transform=marker_transform, fontsize="xx-small", rotation=0)
+
+    ax.xaxis.set_major_locator(MaxNLocator(nbins=6))
+    ax.xaxis.set_major_formatter(FuncFormatter(hms))
+    ax.set_xlabel("Time (h:m:s)")
+    ax.set_ylabel("Latency in s")
+    ax.set_xlim(0, end_timestamp)
+    ax.set_yscale("log")
+    return fig, ax
 
-    is_scatter = False
-    if df["read_total"].median() < 20:
-        is_scatter = True
+def plot_access_percentile(df: pd.DataFrame, policy_timestamps: np.ndarray, access, path):
+    end_timestamp = df["now"].max()
+    fig, ax = make_axes(policy_timestamps, end_timestamp)
+
+    # a prefix is enough to pick the plot style
+    sample = df["read_total"].to_numpy()[:2048]
+    is_scatter = len(sample) > 0 and np.median(sample) < 20
 
-    for color, column in zip(colors, [f"{access}_median", f"{access}_avg", f"{access}_p90", f"{access}_p95", f"{access}_p99", f"{access}_max"]):
+    now = df["now"].to_numpy()
+    columns = [f"{access}_median", f"{access}_avg", f"{access}_p90", f"{access}_p95", f"{access}_p99", f"{access}_max"]
+    # latencies in s, scaled once and shared by the lines and the spans
+    scaled = {column: df[column].to_numpy() / 1_000_000 for column in columns}
+    for color, column in zip(colors, columns):
         if is_scatter: 
-            ax.scatter(df["now"], df[column] / 1_000_000, label=column, linewidths=0.5, color=color)
+            ax.scatter(now, scaled[column], label=column, linewidths=0.5, color=color, rasterized=True)
         else:
-            ax.plot(df["now"], df[column] / 1_000_000, label=column, color=color)
+            ax.plot(now, scaled[column], label=column, color=color, rasterized=True)
         # trend = np.polyfit(df["now"].to_numpy(), df[column].to_numpy() / 1_000_000, 4)
         # ax.plot(df["now"], np.poly1d(trend)(df["now"].to_numpy()), linewidth=2, linestyle="dashed", alpha=0.8, color=color)
-    ax.set_title("Zipf Batch - Latencies over Iteration")
 
     # # Averages trend line to approximate iteration I/O time
     # avgs = np.polyfit(df["now"].to_numpy(), df[f"{access}_avg"].to_numpy() / 1_000_000, 1)
     # ax.plot(df["now"], np.poly1d(avgs)(df["now"].to_numpy()), linewidth=2, linestyle="dashed", alpha=0.8)
 
-    file_suffix = "svg"
-    #if len(df.index) > 1000:
-    #    # avoid painfully slow svg by switching to rasterized plots
-    #    file_suffix = "png"
+    interval = df["interval"].to_numpy()
+    median = scaled[f"{access}_median"]
+    maximum = scaled[f"{access}_max"]
+    # each span starts where the previous iteration ended
+    last_end = np.concatenate(([0], now[:-1] + interval[:-1]))
+    spans = np.stack([
+            np.column_stack([last_end, median]),
+            np.column_stack([now, median]),
+            np.column_stack([now, maximum]),
+            np.column_stack([last_end, maximum]),
+        ], axis=1)
+    ax.add_collection(PolyCollection(spans, alpha=0.5, rasterized=True))
+    ax.autoscale_view()
 
-    end_timestamp = df["now"].max()
-    last_end = 0
-    for index, row in df.iterrows():
-        ax.axhspan(
-                row[f"{access}_median"] / 1_000_000,
-                row[f"{access}_max"] / 1_000_000,
-                xmin=last_end/end_timestamp,
-                xmax=row["now"]/end_timestamp,
-                alpha=0.5
-            )
-        last_end = row["now"] + row["interval"]
-
-    for timestamp in pdf["now"].unique():
-        ax.axvline(timestamp, color="black", linewidth=0.7, linestyle=":", alpha=0.8)
-        down, up = ax.get_ylim()
-        ax.text(timestamp, up, "M", fontsize="xx-small", rotation=0)
-
-    ticks = ax.get_xticks()
-    ax.set_xticks(ticks, [f"{int(lbl/60/60)}:{int(lbl/60%60)}:{int(lbl%60)}" for lbl in ticks])
-    ax.set_xlabel("Time (h:m:s)")
-    ax.set_ylabel("Latency in s")
-    ax.set_xlim(0, end_timestamp)
-    ax.set_yscale("log")
     ax.legend(bbox_to_anchor=(1.04,1))
-    fig.savefig(f"{path}.{file_suffix}", bbox_inches="tight")
+    # dense data is rasterized per artist, axes and text stay vectorized
+    fig.savefig(f"{path}.svg", bbox_inches="tight", dpi=300)
 
 if len(sys.argv) < 3:
     print(f"Usage: {sys.argv[0]} <PATH_TO_APP_CSV> <PATH_TO_POLICY_CSV>")
     sys.exit(1)
 
-plt.rcParams["font.family"] = "Iosevka"
-app_data = pd.read_csv(sys.argv[1])
-policy_data = pd.read_csv(sys.argv[2])
-plot_access_percentile(app_data, policy_data, "read", "zipf_batch_read")
-plot_access_percentile(app_data, policy_data, "write", "zipf_batch_write")
+# Iosevka only if installed, otherwise glyph lookups fall back one by one
+if any(font.name == "Iosevka" for font in font_manager.fontManager.ttflist):
+    matplotlib.rcParams["font.family"] = "Iosevka"
+matplotlib.rcParams["svg.fonttype"] = "none"
+app_data = read_csv(sys.argv[1], app_types)
+policy_timestamps = read_unique(sys.argv[2], "now")
+plot_access_percentile(app_data, policy_timestamps, "read", "zipf_batch_read")
+plot_access_percentile(app_data, policy_timestamps, "write", "zipf_batch_write")